@@ -4,10 +4,11 @@
 
 """This module provides some operators for continuous finite element discretizations."""
 
+import threading
 from functools import partial
 
 import numpy as np
-from scipy.sparse import coo_matrix, csc_matrix
+from scipy.sparse import csc_matrix
 
 from pymor.algorithms.preassemble import preassemble as preassemble_
 from pymor.algorithms.timestepping import ExplicitEulerTimeStepper, ImplicitEulerTimeStepper
@@ -48,10 +49,212 @@ LagrangeShapeFunctionsGrads = {
 }
 
 
+_SHAPE_FUNCTIONS_AT_QUADRATURE = {}
+_SCRATCH = threading.local()
+
+
+def _is_uniform(A):
+    """Check if all `A[i]` agree with `A[0]` up to round-off errors."""
+    return np.allclose(A, A[0], rtol=1e-12, atol=1e-12 * np.abs(A).max())
+
+
+def _getstate_without_grid_data(self):
+    # the pre-fetched grid data can be large, so it is not pickled but fetched again
+    # on the next assembly
+    state = self.__dict__.copy()
+    state.pop('_grid_data', None)
+    return state
+
+
 def CGVectorSpace(grid, id='STATE'):
     return NumpyVectorSpace(grid.size(grid.dim), id)
 
 
+def _shape_functions_at_quadrature(reference_element, order):
+    """Evaluate the linear Lagrange shape functions on a quadrature of the reference element.
+
+    Returns the quadrature points `q` and weights `w`, the values `SF` of the shape
+    functions with shape (number of shape functions, number of quadrature points) and
+    their gradients `SF_GRAD`. For simplices, the gradients are constant and of shape
+    (number of shape functions, dim), otherwise they are evaluated on the quadrature
+    points and of shape (number of shape functions, dim, number of quadrature points).
+
+    The evaluations are only computed once for each reference element and order.
+    """
+    key = (reference_element, order)
+    if key not in _SHAPE_FUNCTIONS_AT_QUADRATURE:
+        q, w = reference_element.quadrature(order=order)
+        SF = np.array(tuple(f(q) for f in LagrangeShapeFunctions[reference_element][1]))
+        SF_GRAD = LagrangeShapeFunctionsGrads[reference_element][1]
+        if callable(SF_GRAD):
+            SF_GRAD = SF_GRAD(q)
+        _SHAPE_FUNCTIONS_AT_QUADRATURE[key] = q, w, SF, SF_GRAD
+    return _SHAPE_FUNCTIONS_AT_QUADRATURE[key]
+
+
+def _global_dofs(grid, boundary_info, dirichlet_clear_rows, dirichlet_clear_columns, dirichlet_clear_diag,
+                 pattern=False):
+    """Determine the global DOFs of the local matrix entries and the Dirichlet treatment.
+
+    Returns a dict with the row and column DOFs `SF_I0`, `SF_I1` of the local matrix
+    entries, the indices `DIRICHLET_ENTRIES` of the entries which have to be cleared
+    and the Dirichlet DOFs `DIRICHLET_DIAG` for which the diagonal entries are set to
+    one. These are appended to `SF_I0` and `SF_I1`.
+    If `pattern` is `True`, the sparsity pattern `PATTERN` of the matrix is computed
+    instead (see :func:`_csc_pattern`), and `SF_I0`, `SF_I1` are `None`, as they are
+    not needed for the assembly anymore. Otherwise `PATTERN` is `None`.
+    """
+    g = grid
+    bi = boundary_info
+
+    # the DOFs of the local matrix entries are only formed as broadcast views of
+    # the element DOFs and only materialized once they are needed as flat arrays
+    SF_I = g.subentities(0, g.dim)
+    local_shape = SF_I.shape + SF_I.shape[1:]
+    SF_I0 = np.broadcast_to(SF_I[:, :, np.newaxis], local_shape)
+    SF_I1 = np.broadcast_to(SF_I[:, np.newaxis, :], local_shape)
+
+    DIRICHLET_MASK = np.zeros(SF_I0.size, dtype=bool)
+    DIRICHLET_DIAG = np.zeros(0, dtype=SF_I.dtype)
+    if bi.has_dirichlet:
+        # Dirichlet DOFs of the elements, broadcast to the rows/columns of the local matrices
+        ELEMENT_MASK = bi.dirichlet_mask(g.dim)[SF_I]
+        LOCAL_MASK = DIRICHLET_MASK.reshape(local_shape)
+        if dirichlet_clear_rows:
+            LOCAL_MASK |= ELEMENT_MASK[:, :, np.newaxis]
+        if dirichlet_clear_columns:
+            LOCAL_MASK |= ELEMENT_MASK[:, np.newaxis, :]
+        if not dirichlet_clear_diag and (dirichlet_clear_rows or dirichlet_clear_columns):
+            DIRICHLET_DIAG = bi.dirichlet_boundaries(g.dim)
+
+    if DIRICHLET_DIAG.size or not pattern:
+        # write the local DOFs and the Dirichlet DOFs directly into the final arrays
+        n = SF_I0.size
+        I0, I1 = np.empty((2, n + DIRICHLET_DIAG.size), dtype=SF_I.dtype)
+        I0[:n].reshape(local_shape)[...] = SF_I0
+        I1[:n].reshape(local_shape)[...] = SF_I1
+        I0[n:] = I1[n:] = DIRICHLET_DIAG
+        SF_I0, SF_I1 = I0, I1
+
+    if pattern:
+        PATTERN = _csc_pattern(SF_I0, SF_I1, (g.size(g.dim), g.size(g.dim)))
+        SF_I0 = SF_I1 = None
+    else:
+        PATTERN = None
+
+    # only few entries are affected by the Dirichlet treatment, so store their indices
+    # instead of the full mask
+    return dict(SF_I0=SF_I0, SF_I1=SF_I1, DIRICHLET_ENTRIES=np.flatnonzero(DIRICHLET_MASK),
+                DIRICHLET_DIAG=DIRICHLET_DIAG, PATTERN=PATTERN)
+
+
+def _dirichlet_treatment(SF_INTS, dofs):
+    """Apply the Dirichlet treatment determined by :func:`_global_dofs` to the local matrix entries.
+
+    `SF_INTS` has to be obtained from :func:`_local_matrices`. The entries to be cleared
+    are set to zero in-place and the returned array additionally contains the ones for
+    the diagonal entries of the Dirichlet DOFs.
+    """
+    SF_INTS[dofs['DIRICHLET_ENTRIES']] = 0
+    if dofs['DIRICHLET_DIAG'].size:
+        SF_INTS = _SCRATCH.buffers[SF_INTS.dtype][:SF_INTS.size + dofs['DIRICHLET_DIAG'].size]
+    return SF_INTS
+
+
+def _csc_pattern(rows, cols, shape):
+    """Compute the sparsity pattern of a CSC matrix assembled from COO triplets.
+
+    Returns a tuple `(perm, indices, indptr)`, where `perm` maps each triplet to the
+    position of the corresponding entry in the data array of the matrix. `rows` and
+    `cols` may be of any (broadcastable) shape and are flattened in C order.
+    """
+    keys = (cols.astype(np.int64) * shape[0] + rows).ravel()
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    first = np.diff(keys, prepend=-1) != 0
+    perm = np.empty_like(order)
+    perm[order] = np.cumsum(first) - 1
+    keys = keys[first]
+    index_dtype = np.int32 if max(shape) <= np.iinfo(np.int32).max else np.int64
+    indptr = np.searchsorted(keys, np.arange(shape[1] + 1) * shape[0]).astype(index_dtype)
+    return perm, (keys % shape[0]).astype(index_dtype), indptr
+
+
+def _einsum(paths, subscripts, *operands, out=None):
+    """Evaluate :func:`numpy.einsum` along a contraction path cached in the dict `paths`.
+
+    The path is determined once per `subscripts` via :func:`numpy.einsum_path`, so
+    repeated assemblies of the same operator do not need to search for it again.
+    """
+    path = paths.get(subscripts)
+    if path is None:
+        path = paths[subscripts] = np.einsum_path(subscripts, *operands, optimize='greedy')[0]
+    return np.einsum(subscripts, *operands, optimize=path, out=out)
+
+
+def _local_matrices(gd, shape, dtype):
+    """Return a buffer for the local matrix entries of all elements.
+
+    The buffer is reused for further assemblies instead of allocating a new array each
+    time. As operators may be assembled concurrently, each thread has its own buffer
+    for each `dtype`, which is shared by all operators assembled in this thread. The
+    buffers are thread-local data, so they are not part of the state of the operators
+    and are freed together with their thread.
+
+    The buffer is followed by the ones for the diagonal entries of the Dirichlet DOFs,
+    such that the complete data array of the matrix triplets is available after
+    :func:`_dirichlet_treatment` without further copies.
+    """
+    n = np.prod(shape)
+    size = n + gd['DIRICHLET_DIAG'].size
+    dtype = np.dtype(dtype)
+    if not hasattr(_SCRATCH, 'buffers'):
+        _SCRATCH.buffers = {}
+    buffer = _SCRATCH.buffers.get(dtype)
+    if buffer is None or buffer.size < size:
+        buffer = _SCRATCH.buffers[dtype] = np.empty(size, dtype=dtype)
+    buffer[n:size] = 1
+    return buffer[:n].reshape(shape)
+
+
+def _bincount(indices, weights, minlength):
+    """Sum up `weights` with equal `indices` into a dense vector of length (at least) `minlength`.
+
+    In contrast to :func:`numpy.bincount`, complex `weights` are supported.
+    """
+    if np.iscomplexobj(weights):
+        return (np.bincount(indices, weights=weights.real, minlength=minlength)
+                + 1j * np.bincount(indices, weights=weights.imag, minlength=minlength))
+    return np.bincount(indices, weights=weights, minlength=minlength)
+
+
+def _assemble_csc(data, rows, cols, shape, pattern=None):
+    """Assemble a sparse matrix in CSC format from COO triplets.
+
+    Zero entries are dropped and entries with equal coordinates are summed up.
+    The triplets are directly handed to SciPy's compiled COO to CSC conversion,
+    which already trims the data arrays to the final number of non-zeros, so no
+    additional copy of the matrix is required.
+
+    If the sparsity `pattern` of the triplets has been precomputed using
+    :func:`_csc_pattern`, the entries are directly summed up into the data
+    array of the matrix instead.
+    """
+    if pattern is None:
+        nonzero = data != 0
+        if not np.all(nonzero):
+            data, rows, cols = data[nonzero], rows[nonzero], cols[nonzero]
+        return csc_matrix((data, (rows, cols)), shape=shape)
+
+    perm, indices, indptr = pattern
+    data = _bincount(perm, data, len(indices))
+    nonzero = data != 0
+    if np.all(nonzero):
+        return csc_matrix((data, indices.copy(), indptr.copy()), shape=shape)
+    indptr = np.concatenate(([0], np.cumsum(nonzero)))[indptr]
+    return csc_matrix((data[nonzero], indices[nonzero], indptr), shape=shape)
+
+
 class L2ProductFunctionalP1(NumpyMatrixBasedOperator):
     """Linear functional representing the inner product with an L2-|Function|.
 
@@ -79,28 +282,31 @@ class L2ProductFunctionalP1(NumpyMatrixBasedOperator):
         assert not dirichlet_clear_dofs or boundary_info
         self.__auto_init(locals())
         self.range = CGVectorSpace(grid)
+        self._function_values = None
 
     def _assemble(self, mu=None):
         g = self.grid
         bi = self.boundary_info
 
-        # evaluate function at element centers
-        F = self.function(g.centers(0), mu=mu)
+        # evaluate function at element centers, the values are kept if they do not depend on mu
+        F = self._function_values
+        if F is None:
+            F = self.function(g.centers(0), mu=mu)
+            if not self.function.parametric:
+                self._function_values = F
 
-        # evaluate the shape functions at the quadrature points on the reference
-        # element -> shape = (number of shape functions, number of quadrature points)
-        q, w = g.reference_element.quadrature(order=1)
-        SF = LagrangeShapeFunctions[g.reference_element][1]
-        SF = np.array(tuple(f(q) for f in SF))
+        # integrate the shape functions on the reference element
+        # -> shape = (number of shape functions,)
+        _, w, SF, _ = _shape_functions_at_quadrature(g.reference_element, 1)
+        SF_INT = SF @ w
 
         # integrate the products of the function with the shape functions on each element
         # -> shape = (g.size(0), number of shape functions)
-        SF_INTS = np.einsum('e,pi,e,i->ep', F, SF, g.integration_elements(0), w).ravel()
+        SF_INTS = np.multiply.outer(F * g.integration_elements(0), SF_INT).ravel()
 
         # map local DOFs to global DOFs
-        # FIXME This implementation is horrible, find a better way!
         SF_I = g.subentities(0, g.dim).ravel()
-        I = coo_matrix((SF_INTS, (np.zeros_like(SF_I), SF_I)), shape=(1, g.size(g.dim))).toarray().ravel()
+        I = _bincount(SF_I, SF_INTS, g.size(g.dim))
 
         if self.dirichlet_clear_dofs and bi.has_dirichlet:
             DI = bi.dirichlet_boundaries(g.dim)
@@ -139,24 +345,27 @@ class BoundaryL2ProductFunctional(NumpyMatrixBasedOperator):
         assert not (boundary_type or dirichlet_clear_dofs) or boundary_info
         self.__auto_init(locals())
         self.range = CGVectorSpace(grid)
+        self._function_values = None
 
     def _assemble(self, mu=None):
         g = self.grid
         bi = self.boundary_info
 
         NI = bi.boundaries(self.boundary_type, 1) if self.boundary_type else g.boundaries(1)
+        # the values of the function are kept if they do not depend on mu
+        F = self._function_values
+        if F is None:
+            F = self.function(g.centers(1)[NI], mu=mu)
+            if not self.function.parametric:
+                self._function_values = F
         if g.dim == 1:
             I = np.zeros(self.range.dim)
-            I[NI] = self.function(g.centers(1)[NI], mu=mu)
+            I[NI] = F
         else:
-            F = self.function(g.centers(1)[NI], mu=mu)
-            q, w = line.quadrature(order=1)
-            # remove last dimension of q, as line coordinates are one dimensional
-            q = q[:, 0]
-            SF = np.array([1 - q, q])
-            SF_INTS = np.einsum('e,pi,e,i->ep', F, SF, g.integration_elements(1)[NI], w).ravel()
+            _, w, SF, _ = _shape_functions_at_quadrature(line, 1)
+            SF_INTS = np.multiply.outer(F * g.integration_elements(1)[NI], SF @ w).ravel()
             SF_I = g.subentities(1, 2)[NI].ravel()
-            I = coo_matrix((SF_INTS, (np.zeros_like(SF_I), SF_I)), shape=(1, g.size(g.dim))).toarray().ravel()
+            I = _bincount(SF_I, SF_INTS, g.size(g.dim))
 
         if self.dirichlet_clear_dofs and bi.has_dirichlet:
             DI = bi.dirichlet_boundaries(g.dim)
@@ -187,6 +396,7 @@ class BoundaryDirichletFunctional(NumpyMatrixBasedOperator):
         assert grid.reference_element(0) in {line, triangle, square}
         self.__auto_init(locals())
         self.range = CGVectorSpace(grid)
+        self._dirichlet_values = None
 
     def _assemble(self, mu=None):
         g = self.grid
@@ -194,7 +404,13 @@ class BoundaryDirichletFunctional(NumpyMatrixBasedOperator):
 
         I = np.zeros(self.range.dim)
         DI = bi.dirichlet_boundaries(g.dim)
-        I[DI] = self.dirichlet_data(g.centers(g.dim)[DI], mu=mu)
+        # the Dirichlet values are kept if they do not depend on mu
+        values = self._dirichlet_values
+        if values is None:
+            values = self.dirichlet_data(g.centers(g.dim)[DI], mu=mu)
+            if not self.dirichlet_data.parametric:
+                self._dirichlet_values = values
+        I[DI] = values
 
         return I.reshape((-1, 1))
 
@@ -226,29 +442,31 @@ class L2ProductFunctionalQ1(NumpyMatrixBasedOperator):
         assert not dirichlet_clear_dofs or boundary_info
         self.__auto_init(locals())
         self.range = CGVectorSpace(grid)
+        self._function_values = None
 
     def _assemble(self, mu=None):
         g = self.grid
         bi = self.boundary_info
 
-        # evaluate function at all quadrature points ->
-        #   shape = (g.size(0), number of quadrature points)
-        F = self.function(g.centers(0), mu=mu)
+        # evaluate function at element centers, the values are kept if they do not depend on mu
+        F = self._function_values
+        if F is None:
+            F = self.function(g.centers(0), mu=mu)
+            if not self.function.parametric:
+                self._function_values = F
 
-        # evaluate the shape functions at the quadrature points on the reference
-        # element -> shape = (number of shape functions, number of quadrature points)
-        q, w = g.reference_element.quadrature(order=1)
-        SF = LagrangeShapeFunctions[g.reference_element][1]
-        SF = np.array(tuple(f(q) for f in SF))
+        # integrate the shape functions on the reference element
+        # -> shape = (number of shape functions,)
+        _, w, SF, _ = _shape_functions_at_quadrature(g.reference_element, 1)
+        SF_INT = SF @ w
 
         # integrate the products of the function with the shape functions on each element
         # -> shape = (g.size(0), number of shape functions)
-        SF_INTS = np.einsum('e,pi,e,i->ep', F, SF, g.integration_elements(0), w).ravel()
+        SF_INTS = np.multiply.outer(F * g.integration_elements(0), SF_INT).ravel()
 
         # map local DOFs to global DOFs
-        # FIXME This implementation is horrible, find a better way!
         SF_I = g.subentities(0, g.dim).ravel()
-        I = coo_matrix((SF_INTS, (np.zeros_like(SF_I), SF_I)), shape=(1, g.size(g.dim))).toarray().ravel()
+        I = _bincount(SF_I, SF_INTS, g.size(g.dim))
 
         if self.dirichlet_clear_dofs and bi.has_dirichlet:
             DI = bi.dirichlet_boundaries(g.dim)
@@ -293,46 +511,48 @@ class L2ProductP1(NumpyMatrixBasedOperator):
         self.__auto_init(locals())
         self.source = self.range = CGVectorSpace(grid)
 
-    def _assemble(self, mu=None):
+    __getstate__ = _getstate_without_grid_data
+
+    def _fetch_grid_data(self):
+        # pre-fetch all µ-independent data, which is kept for further assemblies
+        # in case the operator is parametric
         g = self.grid
-        bi = self.boundary_info
 
         # evaluate the shape functions on the quadrature points
-        q, w = g.reference_element.quadrature(order=2)
-        SF = LagrangeShapeFunctions[g.reference_element][1]
-        SF = np.array(tuple(f(q) for f in SF))
+        _, w, SF, _ = _shape_functions_at_quadrature(g.reference_element, 2)
+
+        # the local mass matrices are multiples of the mass matrix of the reference element
+        # -> shape = (number of shape functions ** 2,)
+        REFERENCE_MASS = np.einsum('iq,jq,q->ij', SF, SF, w).ravel()
+
+        self.logger.info('Determine global dofs ...')
+        gd = dict(REFERENCE_MASS=REFERENCE_MASS, INTEGRATION_ELEMENTS=g.integration_elements(0), CENTERS=g.centers(0),
+                  **_global_dofs(g, self.boundary_info, self.dirichlet_clear_rows, self.dirichlet_clear_columns,
+                                 self.dirichlet_clear_diag, pattern=self.parametric))
+        if self.parametric:
+            self._grid_data = gd
+        return gd
+
+    def _assemble(self, mu=None):
+        g = self.grid
+        gd = self._grid_data if hasattr(self, '_grid_data') else self._fetch_grid_data()
 
         self.logger.info('Integrate the products of the shape functions on each element')
         # -> shape = (g.size(0), number of shape functions ** 2)
         if self.coefficient_function is not None:
-            C = self.coefficient_function(self.grid.centers(0), mu=mu)
-            SF_INTS = np.einsum('iq,jq,q,e,e->eij', SF, SF, w, g.integration_elements(0), C).ravel()
-            del C
+            C = self.coefficient_function(gd['CENTERS'], mu=mu)
+            SCALE = gd['INTEGRATION_ELEMENTS'] * C
         else:
-            SF_INTS = np.einsum('iq,jq,q,e->eij', SF, SF, w, g.integration_elements(0)).ravel()
-
-        del SF
-
-        self.logger.info('Determine global dofs ...')
-        SF_I0 = np.repeat(g.subentities(0, g.dim), g.dim + 1, axis=1).ravel()
-        SF_I1 = np.tile(g.subentities(0, g.dim), [1, g.dim + 1]).ravel()
+            SCALE = gd['INTEGRATION_ELEMENTS']
+        SF_INTS = _local_matrices(gd, (g.size(0), len(gd['REFERENCE_MASS'])), SCALE.dtype)
+        np.multiply.outer(SCALE, gd['REFERENCE_MASS'], out=SF_INTS)
+        SF_INTS = SF_INTS.ravel()
 
         self.logger.info('Boundary treatment ...')
-        if bi.has_dirichlet:
-            if self.dirichlet_clear_rows:
-                SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I0], 0, SF_INTS)
-            if self.dirichlet_clear_columns:
-                SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I1], 0, SF_INTS)
-            if not self.dirichlet_clear_diag and (self.dirichlet_clear_rows or self.dirichlet_clear_columns):
-                SF_INTS = np.hstack((SF_INTS, np.ones(bi.dirichlet_boundaries(g.dim).size)))
-                SF_I0 = np.hstack((SF_I0, bi.dirichlet_boundaries(g.dim)))
-                SF_I1 = np.hstack((SF_I1, bi.dirichlet_boundaries(g.dim)))
+        SF_INTS = _dirichlet_treatment(SF_INTS, gd)
 
         self.logger.info('Assemble system matrix ...')
-        A = coo_matrix((SF_INTS, (SF_I0, SF_I1)), shape=(g.size(g.dim), g.size(g.dim)))
-        del SF_INTS, SF_I0, SF_I1
-        A.eliminate_zeros()
-        A = csc_matrix(A).copy()  # See DiffusionOperatorP1 for why copy() is necessary
+        A = _assemble_csc(SF_INTS, gd['SF_I0'], gd['SF_I1'], (g.size(g.dim), g.size(g.dim)), gd['PATTERN'])
 
         return A
 
@@ -373,46 +593,48 @@ class L2ProductQ1(NumpyMatrixBasedOperator):
         self.__auto_init(locals())
         self.source = self.range = CGVectorSpace(grid)
 
-    def _assemble(self, mu=None):
+    __getstate__ = _getstate_without_grid_data
+
+    def _fetch_grid_data(self):
+        # pre-fetch all µ-independent data, which is kept for further assemblies
+        # in case the operator is parametric
         g = self.grid
-        bi = self.boundary_info
 
         # evaluate the shape functions on the quadrature points
-        q, w = square.quadrature(order=2)
-        SF = LagrangeShapeFunctions[g.reference_element][1]
-        SF = np.array(tuple(f(q) for f in SF))
+        _, w, SF, _ = _shape_functions_at_quadrature(g.reference_element, 2)
+
+        # the local mass matrices are multiples of the mass matrix of the reference element
+        # -> shape = (number of shape functions ** 2,)
+        REFERENCE_MASS = np.einsum('iq,jq,q->ij', SF, SF, w).ravel()
+
+        self.logger.info('Determine global dofs ...')
+        gd = dict(REFERENCE_MASS=REFERENCE_MASS, INTEGRATION_ELEMENTS=g.integration_elements(0), CENTERS=g.centers(0),
+                  **_global_dofs(g, self.boundary_info, self.dirichlet_clear_rows, self.dirichlet_clear_columns,
+                                 self.dirichlet_clear_diag, pattern=self.parametric))
+        if self.parametric:
+            self._grid_data = gd
+        return gd
+
+    def _assemble(self, mu=None):
+        g = self.grid
+        gd = self._grid_data if hasattr(self, '_grid_data') else self._fetch_grid_data()
 
         self.logger.info('Integrate the products of the shape functions on each element')
         # -> shape = (g.size(0), number of shape functions ** 2)
         if self.coefficient_function is not None:
-            C = self.coefficient_function(self.grid.centers(0), mu=mu)
-            SF_INTS = np.einsum('iq,jq,q,e,e->eij', SF, SF, w, g.integration_elements(0), C).ravel()
-            del C
+            C = self.coefficient_function(gd['CENTERS'], mu=mu)
+            SCALE = gd['INTEGRATION_ELEMENTS'] * C
         else:
-            SF_INTS = np.einsum('iq,jq,q,e->eij', SF, SF, w, g.integration_elements(0)).ravel()
-
-        del SF
-
-        self.logger.info('Determine global dofs ...')
-        SF_I0 = np.repeat(g.subentities(0, g.dim), 4, axis=1).ravel()
-        SF_I1 = np.tile(g.subentities(0, g.dim), [1, 4]).ravel()
+            SCALE = gd['INTEGRATION_ELEMENTS']
+        SF_INTS = _local_matrices(gd, (g.size(0), len(gd['REFERENCE_MASS'])), SCALE.dtype)
+        np.multiply.outer(SCALE, gd['REFERENCE_MASS'], out=SF_INTS)
+        SF_INTS = SF_INTS.ravel()
 
         self.logger.info('Boundary treatment ...')
-        if bi.has_dirichlet:
-            if self.dirichlet_clear_rows:
-                SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I0], 0, SF_INTS)
-            if self.dirichlet_clear_columns:
-                SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I1], 0, SF_INTS)
-            if not self.dirichlet_clear_diag and (self.dirichlet_clear_rows or self.dirichlet_clear_columns):
-                SF_INTS = np.hstack((SF_INTS, np.ones(bi.dirichlet_boundaries(g.dim).size)))
-                SF_I0 = np.hstack((SF_I0, bi.dirichlet_boundaries(g.dim)))
-                SF_I1 = np.hstack((SF_I1, bi.dirichlet_boundaries(g.dim)))
+        SF_INTS = _dirichlet_treatment(SF_INTS, gd)
 
         self.logger.info('Assemble system matrix ...')
-        A = coo_matrix((SF_INTS, (SF_I0, SF_I1)), shape=(g.size(g.dim), g.size(g.dim)))
-        del SF_INTS, SF_I0, SF_I1
-        A.eliminate_zeros()
-        A = csc_matrix(A).copy()  # See DiffusionOperatorP1 for why copy() is necessary
+        A = _assemble_csc(SF_INTS, gd['SF_I0'], gd['SF_I1'], (g.size(g.dim), g.size(g.dim)), gd['PATTERN'])
 
         return A
 
@@ -445,6 +667,10 @@ class DiffusionOperatorP1(NumpyMatrixBasedOperator):
     dirichlet_clear_diag
         If `True`, also set diagonal entries corresponding to Dirichlet boundary DOFs to
         zero. Otherwise they are set to one.
+    assembly_dtype
+        The floating point type used for computing the local stiffness matrices.
+        Choosing `np.float32` reduces the memory traffic during assembly at the
+        expense of accuracy. The assembled matrix is always of double precision.
     solver_options
         The |solver_options| for the operator.
     name
@@ -454,7 +680,7 @@ class DiffusionOperatorP1(NumpyMatrixBasedOperator):
     sparse = True
 
     def __init__(self, grid, boundary_info, diffusion_function=None, diffusion_constant=None,
-                 dirichlet_clear_columns=False, dirichlet_clear_diag=False,
+                 dirichlet_clear_columns=False, dirichlet_clear_diag=False, assembly_dtype=np.float64,
                  solver_options=None, name=None):
         assert grid.reference_element(0) in {triangle, line}, 'A simplicial grid is expected!'
         assert diffusion_function is None \
@@ -462,62 +688,74 @@ class DiffusionOperatorP1(NumpyMatrixBasedOperator):
                 and diffusion_function.dim_domain == grid.dim
                 and diffusion_function.shape_range == ()
                 or diffusion_function.shape_range == (grid.dim,) * 2)
+        assert assembly_dtype in {np.float32, np.float64}
         self.__auto_init(locals())
         self.source = self.range = CGVectorSpace(grid)
 
-    def _assemble(self, mu=None):
+    __getstate__ = _getstate_without_grid_data
+
+    def _fetch_grid_data(self):
+        # pre-fetch all µ-independent data, which is kept for further assemblies
+        # in case the operator is parametric
         g = self.grid
-        bi = self.boundary_info
 
         # gradients of shape functions
         SF_GRAD = LagrangeShapeFunctionsGrads[g.reference_element][1]
 
-        self.logger.info('Calculate gradients of shape functions transformed by reference map ...')
-        SF_GRADS = np.einsum('eij,pj->epi', g.jacobian_inverse_transposed(0), SF_GRAD)
+        # as the gradients are constant on each element, the local stiffness matrices are
+        # obtained by mapping the (possibly diffusion weighted) metric tensor
+        # JIT^T JIT of each element with the products of the reference gradients
+        # -> shape = (g.dim ** 2, number of shape functions ** 2)
+        SF_GRAD_PRODUCTS = np.einsum('pi,qj->ijpq', SF_GRAD, SF_GRAD).reshape(g.dim ** 2, -1)
+
+        JIT = g.jacobian_inverse_transposed(0)
+        self.logger.info('Calculate metric tensors of reference maps ...')
+        METRIC = np.einsum('eki,ekj,e->eij', JIT, JIT, g.volumes(0), optimize=True).reshape(-1, g.dim ** 2)
+
+        dtype = self.assembly_dtype
+        self.logger.info('Determine global dofs ...')
+        gd = dict(EINSUM_PATHS={}, SF_GRAD_PRODUCTS=SF_GRAD_PRODUCTS.astype(dtype), METRIC=METRIC.astype(dtype),
+                  JIT=JIT.astype(dtype, copy=False), VOLUMES=g.volumes(0).astype(dtype, copy=False),
+                  CENTERS=g.centers(0),
+                  **_global_dofs(g, self.boundary_info, True, self.dirichlet_clear_columns, self.dirichlet_clear_diag,
+                                 pattern=self.parametric))
+        if self.parametric:
+            self._grid_data = gd
+        return gd
+
+    def _assemble(self, mu=None):
+        g = self.grid
+        gd = self._grid_data if hasattr(self, '_grid_data') else self._fetch_grid_data()
 
         self.logger.info('Calculate all local scalar products between gradients ...')
         if self.diffusion_function is not None and self.diffusion_function.shape_range == ():
-            D = self.diffusion_function(self.grid.centers(0), mu=mu)
-            SF_INTS = np.einsum('epi,eqi,e,e->epq', SF_GRADS, SF_GRADS, g.volumes(0), D).ravel()
-            del D
-        elif self.diffusion_function is not None:
-            D = self.diffusion_function(self.grid.centers(0), mu=mu)
-            SF_INTS = np.einsum('epi,eqj,e,eij->epq', SF_GRADS, SF_GRADS, g.volumes(0), D).ravel()
-            del D
+            D = self.diffusion_function(gd['CENTERS'], mu=mu)
+            # scale the local matrices in-place, so no weighted copy of the metric tensors is needed
+            SF_INTS = _local_matrices(gd, (g.size(0), gd['SF_GRAD_PRODUCTS'].shape[1]), np.result_type(np.float64, D))
+            np.matmul(gd['METRIC'], gd['SF_GRAD_PRODUCTS'], out=SF_INTS)
+            SF_INTS *= D[:, np.newaxis]
         else:
-            SF_INTS = np.einsum('epi,eqi,e->epq', SF_GRADS, SF_GRADS, g.volumes(0)).ravel()
-
-        del SF_GRADS
+            if self.diffusion_function is not None:
+                D = self.diffusion_function(gd['CENTERS'], mu=mu)
+                if not np.iscomplexobj(D):
+                    D = D.astype(self.assembly_dtype, copy=False)
+                METRIC = _einsum(gd['EINSUM_PATHS'], 'eki,ekl,elj,e->eij', gd['JIT'], D, gd['JIT'], gd['VOLUMES'])
+                METRIC = METRIC.reshape(-1, g.dim ** 2)
+            else:
+                METRIC = gd['METRIC']
+            SF_INTS = _local_matrices(gd, (g.size(0), gd['SF_GRAD_PRODUCTS'].shape[1]),
+                                      np.result_type(np.float64, METRIC))
+            np.matmul(METRIC, gd['SF_GRAD_PRODUCTS'], out=SF_INTS)
+        SF_INTS = SF_INTS.ravel()
 
         if self.diffusion_constant is not None:
             SF_INTS *= self.diffusion_constant
 
-        self.logger.info('Determine global dofs ...')
-        SF_I0 = np.repeat(g.subentities(0, g.dim), g.dim + 1, axis=1).ravel()
-        SF_I1 = np.tile(g.subentities(0, g.dim), [1, g.dim + 1]).ravel()
-
         self.logger.info('Boundary treatment ...')
-        if bi.has_dirichlet:
-            SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I0], 0, SF_INTS)
-            if self.dirichlet_clear_columns:
-                SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I1], 0, SF_INTS)
-
-            if not self.dirichlet_clear_diag:
-                SF_INTS = np.hstack((SF_INTS, np.ones(bi.dirichlet_boundaries(g.dim).size)))
-                SF_I0 = np.hstack((SF_I0, bi.dirichlet_boundaries(g.dim)))
-                SF_I1 = np.hstack((SF_I1, bi.dirichlet_boundaries(g.dim)))
+        SF_INTS = _dirichlet_treatment(SF_INTS, gd)
 
         self.logger.info('Assemble system matrix ...')
-        A = coo_matrix((SF_INTS, (SF_I0, SF_I1)), shape=(g.size(g.dim), g.size(g.dim)))
-        del SF_INTS, SF_I0, SF_I1
-        A.eliminate_zeros()
-        A = csc_matrix(A).copy()
-
-        # The call to copy() is necessary to resize the data arrays of the sparse matrix:
-        # During the conversion to crs_matrix, entries corresponding with the same
-        # coordinates are summed up, resulting in shorter data arrays. The shortening
-        # is implemented by calling self.prune() which creates the view self.data[:self.nnz].
-        # Thus, the original data array is not deleted and all memory stays allocated.
+        A = _assemble_csc(SF_INTS, gd['SF_I0'], gd['SF_I1'], (g.size(g.dim), g.size(g.dim)), gd['PATTERN'])
 
         return A
 
@@ -550,6 +788,10 @@ class DiffusionOperatorQ1(NumpyMatrixBasedOperator):
     dirichlet_clear_diag
         If `True`, also set diagonal entries corresponding to Dirichlet boundary DOFs to
         zero. Otherwise they are set to one.
+    assembly_dtype
+        The floating point type used for computing the local stiffness matrices.
+        Choosing `np.float32` reduces the memory traffic during assembly at the
+        expense of accuracy. The assembled matrix is always of double precision.
     solver_options
         The |solver_options| for the operator.
     name
@@ -559,7 +801,7 @@ class DiffusionOperatorQ1(NumpyMatrixBasedOperator):
     sparse = True
 
     def __init__(self, grid, boundary_info, diffusion_function=None, diffusion_constant=None,
-                 dirichlet_clear_columns=False, dirichlet_clear_diag=False,
+                 dirichlet_clear_columns=False, dirichlet_clear_diag=False, assembly_dtype=np.float64,
                  solver_options=None, name=None):
         assert grid.reference_element(0) in {square}, 'A square grid is expected!'
         assert diffusion_function is None \
@@ -567,65 +809,87 @@ class DiffusionOperatorQ1(NumpyMatrixBasedOperator):
                 and diffusion_function.dim_domain == grid.dim
                 and diffusion_function.shape_range == ()
                 or diffusion_function.shape_range == (grid.dim,) * 2)
+        assert assembly_dtype in {np.float32, np.float64}
         self.__auto_init(locals())
         self.source = self.range = CGVectorSpace(grid)
 
-    def _assemble(self, mu=None):
+    __getstate__ = _getstate_without_grid_data
+
+    def _fetch_grid_data(self):
+        # pre-fetch all µ-independent data, which is kept for further assemblies
+        # in case the operator is parametric
         g = self.grid
-        bi = self.boundary_info
 
         # gradients of shape functions
-        q, w = g.reference_element.quadrature(order=2)
-        SF_GRAD = LagrangeShapeFunctionsGrads[g.reference_element][1]
-        SF_GRAD = SF_GRAD(q)
+        _, w, _, SF_GRAD = _shape_functions_at_quadrature(g.reference_element, 2)
+
+        # the reference maps are affine, so the local stiffness matrices are obtained by
+        # mapping the (possibly diffusion weighted) metric tensor JIT^T JIT of each
+        # element with the integrated products of the reference gradients
+        # -> shape = (g.dim ** 2, number of shape functions ** 2)
+        SF_GRAD_PRODUCTS = np.einsum('pic,qjc,c->ijpq', SF_GRAD, SF_GRAD, w).reshape(g.dim ** 2, -1)
+
+        JIT = g.jacobian_inverse_transposed(0)
+        self.logger.info('Calculate metric tensors of reference maps ...')
+        METRIC = np.einsum('eki,ekj,e->eij', JIT, JIT, g.integration_elements(0),
+                           optimize=True).reshape(-1, g.dim ** 2)
+
+        dtype = self.assembly_dtype
+        # on (up to round-off errors) uniform grids all elements share the same local
+        # stiffness matrix
+        LOCAL_STIFFNESS = (METRIC[0] @ SF_GRAD_PRODUCTS).astype(dtype) if _is_uniform(METRIC) else None
+
+        self.logger.info('Determine global dofs ...')
+        gd = dict(EINSUM_PATHS={}, SF_GRAD_PRODUCTS=SF_GRAD_PRODUCTS.astype(dtype), METRIC=METRIC.astype(dtype),
+                  LOCAL_STIFFNESS=LOCAL_STIFFNESS,
+                  JIT=JIT.astype(dtype, copy=False),
+                  INTEGRATION_ELEMENTS=g.integration_elements(0).astype(dtype, copy=False), CENTERS=g.centers(0),
+                  **_global_dofs(g, self.boundary_info, True, self.dirichlet_clear_columns, self.dirichlet_clear_diag,
+                                 pattern=self.parametric))
+        if self.parametric:
+            self._grid_data = gd
+        return gd
 
-        self.logger.info('Calculate gradients of shape functions transformed by reference map ...')
-        SF_GRADS = np.einsum('eij,pjc->epic', g.jacobian_inverse_transposed(0), SF_GRAD)
+    def _assemble(self, mu=None):
+        g = self.grid
+        gd = self._grid_data if hasattr(self, '_grid_data') else self._fetch_grid_data()
 
         self.logger.info('Calculate all local scalar products between gradients ...')
         if self.diffusion_function is not None and self.diffusion_function.shape_range == ():
-            D = self.diffusion_function(self.grid.centers(0), mu=mu)
-            SF_INTS = np.einsum('epic,eqic,c,e,e->epq', SF_GRADS, SF_GRADS, w, g.integration_elements(0), D).ravel()
-            del D
-        elif self.diffusion_function is not None:
-            D = self.diffusion_function(self.grid.centers(0), mu=mu)
-            SF_INTS = np.einsum('epic,eqjc,c,e,eij->epq', SF_GRADS, SF_GRADS, w, g.integration_elements(0), D).ravel()
-            del D
+            D = self.diffusion_function(gd['CENTERS'], mu=mu)
+            # scale the local matrices in-place, so no weighted copy of the metric tensors is needed
+            SF_INTS = _local_matrices(gd, (g.size(0), gd['SF_GRAD_PRODUCTS'].shape[1]), np.result_type(np.float64, D))
+            if gd['LOCAL_STIFFNESS'] is not None:
+                np.multiply.outer(D, gd['LOCAL_STIFFNESS'], out=SF_INTS)
+            else:
+                np.matmul(gd['METRIC'], gd['SF_GRAD_PRODUCTS'], out=SF_INTS)
+                SF_INTS *= D[:, np.newaxis]
+        elif self.diffusion_function is None and gd['LOCAL_STIFFNESS'] is not None:
+            SF_INTS = _local_matrices(gd, (g.size(0), gd['SF_GRAD_PRODUCTS'].shape[1]), np.float64)
+            SF_INTS[...] = gd['LOCAL_STIFFNESS']
         else:
-            SF_INTS = np.einsum('epic,eqic,c,e->epq', SF_GRADS, SF_GRADS, w, g.integration_elements(0)).ravel()
-
-        del SF_GRADS
+            if self.diffusion_function is not None:
+                D = self.diffusion_function(gd['CENTERS'], mu=mu)
+                if not np.iscomplexobj(D):
+                    D = D.astype(self.assembly_dtype, copy=False)
+                METRIC = _einsum(gd['EINSUM_PATHS'], 'eki,ekl,elj,e->eij', gd['JIT'], D, gd['JIT'],
+                                 gd['INTEGRATION_ELEMENTS'])
+                METRIC = METRIC.reshape(-1, g.dim ** 2)
+            else:
+                METRIC = gd['METRIC']
+            SF_INTS = _local_matrices(gd, (g.size(0), gd['SF_GRAD_PRODUCTS'].shape[1]),
+                                      np.result_type(np.float64, METRIC))
+            np.matmul(METRIC, gd['SF_GRAD_PRODUCTS'], out=SF_INTS)
+        SF_INTS = SF_INTS.ravel()
 
         if self.diffusion_constant is not None:
             SF_INTS *= self.diffusion_constant
 
-        self.logger.info('Determine global dofs ...')
-
-        SF_I0 = np.repeat(g.subentities(0, g.dim), 4, axis=1).ravel()
-        SF_I1 = np.tile(g.subentities(0, g.dim), [1, 4]).ravel()
-
         self.logger.info('Boundary treatment ...')
-        if bi.has_dirichlet:
-            SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I0], 0, SF_INTS)
-            if self.dirichlet_clear_columns:
-                SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I1], 0, SF_INTS)
-
-            if not self.dirichlet_clear_diag:
-                SF_INTS = np.hstack((SF_INTS, np.ones(bi.dirichlet_boundaries(g.dim).size)))
-                SF_I0 = np.hstack((SF_I0, bi.dirichlet_boundaries(g.dim)))
-                SF_I1 = np.hstack((SF_I1, bi.dirichlet_boundaries(g.dim)))
+        SF_INTS = _dirichlet_treatment(SF_INTS, gd)
 
         self.logger.info('Assemble system matrix ...')
-        A = coo_matrix((SF_INTS, (SF_I0, SF_I1)), shape=(g.size(g.dim), g.size(g.dim)))
-        del SF_INTS, SF_I0, SF_I1
-        A.eliminate_zeros()
-        A = csc_matrix(A).copy()
-
-        # The call to copy() is necessary to resize the data arrays of the sparse matrix:
-        # During the conversion to crs_matrix, entries corresponding with the same
-        # coordinates are summed up, resulting in shorter data arrays. The shortening
-        # is implemented by calling self.prune() which creates the view self.data[:self.nnz].
-        # Thus, the original data array is not deleted and all memory stays allocated.
+        A = _assemble_csc(SF_INTS, gd['SF_I0'], gd['SF_I1'], (g.size(g.dim), g.size(g.dim)), gd['PATTERN'])
 
         return A
 
@@ -677,56 +941,51 @@ class AdvectionOperatorP1(NumpyMatrixBasedOperator):
         self.__auto_init(locals())
         self.source = self.range = CGVectorSpace(grid)
 
-    def _assemble(self, mu=None):
+    __getstate__ = _getstate_without_grid_data
+
+    def _fetch_grid_data(self):
+        # pre-fetch all µ-independent data, which is kept for further assemblies
+        # in case the operator is parametric
         g = self.grid
-        bi = self.boundary_info
 
-        q, w = g.reference_element.quadrature(order=1)
-        SF = LagrangeShapeFunctions[g.reference_element][1]
+        _, w, SFQ, SF_GRAD = _shape_functions_at_quadrature(g.reference_element, 1)
+        # SFQ(function, quadraturepoint)
 
-        self.logger.info('Calculate gradients of shape functions transformed by reference map ...')
-        SF_GRAD = LagrangeShapeFunctionsGrads[g.reference_element][1]
-        SF_GRADS = np.einsum('eij,pj->epi', g.jacobian_inverse_transposed(0), SF_GRAD)
-        # SF_GRADS(element, function, component)
+        # the gradients of the shape functions are constant on each element, so the local
+        # matrices are obtained by mapping the advection direction pulled back to the
+        # reference element with the integrated products of the reference gradients and
+        # the shape functions
+        # (the minus sign of the operator is already included here)
+        # -> shape = (g.dim, number of shape functions ** 2)
+        SF_GRAD_PRODUCTS = np.einsum('qj,pc,c->jqp', -SF_GRAD, SFQ, w).reshape(g.dim, -1)
 
-        SFQ = np.array(tuple(f(q) for f in SF))
-        # SFQ(function, quadraturepoint)
+        self.logger.info('Determine global dofs ...')
+        gd = dict(EINSUM_PATHS={}, SF_GRAD_PRODUCTS=SF_GRAD_PRODUCTS, JIT=g.jacobian_inverse_transposed(0),
+                  INTEGRATION_ELEMENTS=g.integration_elements(0), CENTERS=g.centers(0),
+                  **_global_dofs(g, self.boundary_info, True, self.dirichlet_clear_columns, self.dirichlet_clear_diag,
+                                 pattern=self.parametric))
+        if self.parametric:
+            self._grid_data = gd
+        return gd
 
-        self.logger.info('Calculate all local scalar products between gradients ...')
-        D = self.advection_function(self.grid.centers(0), mu=mu)
-        SF_INTS = - np.einsum('pc,eqi,c,e,ei->eqp', SFQ, SF_GRADS, w, g.integration_elements(0), D).ravel()
-        del D
-        del SF_GRADS
+    def _assemble(self, mu=None):
+        g = self.grid
+        gd = self._grid_data if hasattr(self, '_grid_data') else self._fetch_grid_data()
 
+        self.logger.info('Calculate all local scalar products between gradients ...')
+        D = self.advection_function(gd['CENTERS'], mu=mu)
+        D = _einsum(gd['EINSUM_PATHS'], 'eij,ei,e->ej', gd['JIT'], D, gd['INTEGRATION_ELEMENTS'])
         if self.advection_constant is not None:
-            SF_INTS *= self.advection_constant
-
-        self.logger.info('Determine global dofs ...')
-        SF_I0 = np.repeat(g.subentities(0, g.dim), g.dim + 1, axis=1).ravel()
-        SF_I1 = np.tile(g.subentities(0, g.dim), [1, g.dim + 1]).ravel()
+            D *= self.advection_constant
+        SF_INTS = _local_matrices(gd, (g.size(0), gd['SF_GRAD_PRODUCTS'].shape[1]), D.dtype)
+        np.matmul(D, gd['SF_GRAD_PRODUCTS'], out=SF_INTS)
+        SF_INTS = SF_INTS.ravel()
 
         self.logger.info('Boundary treatment ...')
-        if bi.has_dirichlet:
-            SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I0], 0, SF_INTS)
-            if self.dirichlet_clear_columns:
-                SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I1], 0, SF_INTS)
-
-            if not self.dirichlet_clear_diag:
-                SF_INTS = np.hstack((SF_INTS, np.ones(bi.dirichlet_boundaries(g.dim).size)))
-                SF_I0 = np.hstack((SF_I0, bi.dirichlet_boundaries(g.dim)))
-                SF_I1 = np.hstack((SF_I1, bi.dirichlet_boundaries(g.dim)))
+        SF_INTS = _dirichlet_treatment(SF_INTS, gd)
 
         self.logger.info('Assemble system matrix ...')
-        A = coo_matrix((SF_INTS, (SF_I0, SF_I1)), shape=(g.size(g.dim), g.size(g.dim)))
-        del SF_INTS, SF_I0, SF_I1
-        A.eliminate_zeros()
-        A = csc_matrix(A).copy()
-
-        # The call to copy() is necessary to resize the data arrays of the sparse matrix:
-        # During the conversion to crs_matrix, entries corresponding with the same
-        # coordinates are summed up, resulting in shorter data arrays. The shortening
-        # is implemented by calling self.prune() which creates the view self.data[:self.nnz].
-        # Thus, the original data array is not deleted and all memory stays allocated.
+        A = _assemble_csc(SF_INTS, gd['SF_I0'], gd['SF_I1'], (g.size(g.dim), g.size(g.dim)), gd['PATTERN'])
 
         return A
 
@@ -777,57 +1036,61 @@ class AdvectionOperatorQ1(NumpyMatrixBasedOperator):
         self.__auto_init(locals())
         self.source = self.range = CGVectorSpace(grid)
 
-    def _assemble(self, mu=None):
-        g = self.grid
-        bi = self.boundary_info
+    __getstate__ = _getstate_without_grid_data
 
-        self.logger.info('Calculate gradients of shape functions transformed by reference map ...')
-        q, w = g.reference_element.quadrature(order=2)
-        SF_GRAD = LagrangeShapeFunctionsGrads[g.reference_element][1](q)
-        SF_GRADS = np.einsum('eij,pjc->epic', g.jacobian_inverse_transposed(0), SF_GRAD)
-        # SF_GRADS(element,function,component,quadraturepoint)
+    def _fetch_grid_data(self):
+        # pre-fetch all µ-independent data, which is kept for further assemblies
+        # in case the operator is parametric
+        g = self.grid
 
-        SF = LagrangeShapeFunctions[g.reference_element][1]
-        SFQ = np.array(tuple(f(q) for f in SF))
+        _, w, SFQ, SF_GRAD = _shape_functions_at_quadrature(g.reference_element, 2)
         # SFQ(function, quadraturepoint)
+        # SF_GRAD(function, component, quadraturepoint)
+
+        # the reference maps are affine, so the local matrices are obtained by mapping the
+        # advection direction pulled back to the reference element with the integrated
+        # products of the reference gradients and the shape functions
+        # (the minus sign of the operator is already included here)
+        # -> shape = (g.dim, number of shape functions ** 2)
+        SF_GRAD_PRODUCTS = np.einsum('qjc,pc,c->jqp', -SF_GRAD, SFQ, w).reshape(g.dim, -1)
+
+        JIT = g.jacobian_inverse_transposed(0)
+        INTEGRATION_ELEMENTS = g.integration_elements(0)
+        if _is_uniform(JIT) and _is_uniform(INTEGRATION_ELEMENTS):
+            # on (up to round-off errors) uniform grids the pull back of the advection direction
+            # is the same linear map for all elements, so it can already be applied to the
+            # gradient products
+            SF_GRAD_PRODUCTS = INTEGRATION_ELEMENTS[0] * JIT[0] @ SF_GRAD_PRODUCTS
+            JIT = INTEGRATION_ELEMENTS = None
 
-        self.logger.info('Calculate all local scalar products between gradients ...')
+        self.logger.info('Determine global dofs ...')
+        gd = dict(EINSUM_PATHS={}, SF_GRAD_PRODUCTS=SF_GRAD_PRODUCTS, JIT=JIT,
+                  INTEGRATION_ELEMENTS=INTEGRATION_ELEMENTS, CENTERS=g.centers(0),
+                  **_global_dofs(g, self.boundary_info, True, self.dirichlet_clear_columns, self.dirichlet_clear_diag,
+                                 pattern=self.parametric))
+        if self.parametric:
+            self._grid_data = gd
+        return gd
 
-        D = self.advection_function(self.grid.centers(0), mu=mu)
-        SF_INTS = - np.einsum('pc,eqic,c,e,ei->eqp', SFQ, SF_GRADS, w, g.integration_elements(0), D).ravel()
-        del D
-        del SF_GRADS
+    def _assemble(self, mu=None):
+        g = self.grid
+        gd = self._grid_data if hasattr(self, '_grid_data') else self._fetch_grid_data()
 
+        self.logger.info('Calculate all local scalar products between gradients ...')
+        D = self.advection_function(gd['CENTERS'], mu=mu)
+        if gd['JIT'] is not None:
+            D = _einsum(gd['EINSUM_PATHS'], 'eij,ei,e->ej', gd['JIT'], D, gd['INTEGRATION_ELEMENTS'])
         if self.advection_constant is not None:
-            SF_INTS *= self.advection_constant
-
-        self.logger.info('Determine global dofs ...')
-
-        SF_I0 = np.repeat(g.subentities(0, g.dim), 4, axis=1).ravel()
-        SF_I1 = np.tile(g.subentities(0, g.dim), [1, 4]).ravel()
+            D = D * self.advection_constant
+        SF_INTS = _local_matrices(gd, (g.size(0), gd['SF_GRAD_PRODUCTS'].shape[1]), D.dtype)
+        np.matmul(D, gd['SF_GRAD_PRODUCTS'], out=SF_INTS)
+        SF_INTS = SF_INTS.ravel()
 
         self.logger.info('Boundary treatment ...')
-        if bi.has_dirichlet:
-            SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I0], 0, SF_INTS)
-            if self.dirichlet_clear_columns:
-                SF_INTS = np.where(bi.dirichlet_mask(g.dim)[SF_I1], 0, SF_INTS)
-
-            if not self.dirichlet_clear_diag:
-                SF_INTS = np.hstack((SF_INTS, np.ones(bi.dirichlet_boundaries(g.dim).size)))
-                SF_I0 = np.hstack((SF_I0, bi.dirichlet_boundaries(g.dim)))
-                SF_I1 = np.hstack((SF_I1, bi.dirichlet_boundaries(g.dim)))
+        SF_INTS = _dirichlet_treatment(SF_INTS, gd)
 
         self.logger.info('Assemble system matrix ...')
-        A = coo_matrix((SF_INTS, (SF_I0, SF_I1)), shape=(g.size(g.dim), g.size(g.dim)))
-        del SF_INTS, SF_I0, SF_I1
-        A.eliminate_zeros()
-        A = csc_matrix(A).copy()
-
-        # The call to copy() is necessary to resize the data arrays of the sparse matrix:
-        # During the conversion to crs_matrix, entries corresponding with the same
-        # coordinates are summed up, resulting in shorter data arrays. The shortening
-        # is implemented by calling self.prune() which creates the view self.data[:self.nnz].
-        # Thus, the original data array is not deleted and all memory stays allocated.
+        A = _assemble_csc(SF_INTS, gd['SF_I0'], gd['SF_I1'], (g.size(g.dim), g.size(g.dim)), gd['PATTERN'])
 
         return A
 
@@ -880,14 +1143,12 @@ class RobinBoundaryOperator(NumpyMatrixBasedOperator):
             raise NotImplementedError
 
         if bi is None or not bi.has_robin or self.robin_data is None:
-            return coo_matrix((g.size(g.dim), g.size(g.dim))).tocsc()
+            return csc_matrix((g.size(g.dim), g.size(g.dim)))
 
         RI = bi.robin_boundaries(1)
         if g.dim == 1:
             robin_c = self.robin_data[0](g.centers(1)[RI], mu=mu)
-            I = coo_matrix((robin_c, (RI, RI)), shape=(g.size(g.dim), g.size(g.dim)))
-            I.eliminate_zeros()
-            return csc_matrix(I).copy()
+            return _assemble_csc(robin_c, RI, RI, (g.size(g.dim), g.size(g.dim)))
         else:
             xref = g.centers(1)[RI]
             # xref(robin-index, quadraturepoint-index)
@@ -905,12 +1166,12 @@ class RobinBoundaryOperator(NumpyMatrixBasedOperator):
             # remove last dimension of q, as line coordinates are one dimensional
             q = q[:, 0]
             SF = np.array([1 - q, q])
-            SF_INTS = np.einsum('e,pi,pj,e,p->eij', robin_c, SF, SF, g.integration_elements(1)[RI], w).ravel()
-            SF_I0 = np.repeat(g.subentities(1, g.dim)[RI], 2).ravel()
-            SF_I1 = np.tile(g.subentities(1, g.dim)[RI], [1, 2]).ravel()
-            I = coo_matrix((SF_INTS, (SF_I0, SF_I1)), shape=(g.size(g.dim), g.size(g.dim)))
-            I.eliminate_zeros()
-            return csc_matrix(I).copy()
+            REFERENCE_MASS = np.einsum('pi,pj,p->ij', SF, SF, w)
+            SF_INTS = np.multiply.outer(robin_c * g.integration_elements(1)[RI], REFERENCE_MASS).ravel()
+            SF_I = g.subentities(1, g.dim)[RI]
+            SF_I0 = np.broadcast_to(SF_I[:, :, np.newaxis], (len(RI), 2, 2)).ravel()
+            SF_I1 = np.broadcast_to(SF_I[:, np.newaxis, :], (len(RI), 2, 2)).ravel()
+            return _assemble_csc(SF_INTS, SF_I0, SF_I1, (g.size(g.dim), g.size(g.dim)))
 
 
 class InterpolationOperator(NumpyMatrixBasedOperator):
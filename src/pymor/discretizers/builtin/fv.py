@@ -417,9 +417,8 @@ class NonlinearAdvectionOperator(Operator):
         V = np.hstack([D_NUM_FLUX_0[INNER], -D_NUM_FLUX_0[INNER], D_NUM_FLUX_1[INNER], -D_NUM_FLUX_1[INNER],
                        D_NUM_FLUX_0[BOUNDARIES]])
 
-        A = coo_matrix((V, (I0, I1)), shape=(g.size(0), g.size(0)))
-        A.eliminate_zeros()
-        A = csc_matrix(A).copy()   # See pymor.discretizers.builtin.cg.DiffusionOperatorP1 for why copy() is necessary
+        nonzero = V != 0
+        A = csc_matrix((V[nonzero], (I0[nonzero], I1[nonzero])), shape=(g.size(0), g.size(0)))
         A = dia_matrix(([1. / VOLS0], [0]), shape=(g.size(0),) * 2) * A
 
         return NumpyMatrixOperator(A, source_id=self.source.id, range_id=self.range.id)
@@ -509,9 +508,8 @@ class LinearAdvectionLaxFriedrichsOperator(NumpyMatrixBasedOperator):
         I1 = np.hstack([I1_inner, I_out, I_dir])
         V = np.hstack([V_inner, V_out, V_dir])
 
-        A = coo_matrix((V, (I0, I1)), shape=(g.size(0), g.size(0)))
-        A.eliminate_zeros()
-        A = csc_matrix(A).copy()   # See pymor.discretizers.builtin.cg.DiffusionOperatorP1 for why copy() is necessary
+        nonzero = V != 0
+        A = csc_matrix((V[nonzero], (I0[nonzero], I1[nonzero])), shape=(g.size(0), g.size(0)))
         A = dia_matrix(([1. / g.volumes(0)], [0]), shape=(g.size(0),) * 2) * A
 
         return A
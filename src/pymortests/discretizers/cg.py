@@ -0,0 +1,134 @@
+# This file is part of the pyMOR project (https://www.pymor.org).
+# Copyright pyMOR developers and contributors. All rights reserved.
+# License: BSD 2-Clause License (https://opensource.org/licenses/BSD-2-Clause)
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from scipy.sparse import coo_matrix
+
+from pymor.analyticalproblems.functions import ExpressionFunction, GenericFunction
+from pymor.core.pickle import dumps, loads
+from pymor.discretizers.builtin.cg import (
+    BoundaryDirichletFunctional,
+    BoundaryL2ProductFunctional,
+    DiffusionOperatorP1,
+    DiffusionOperatorQ1,
+    L2ProductFunctionalP1,
+    L2ProductFunctionalQ1,
+    _assemble_csc,
+    _csc_pattern,
+    _is_uniform,
+)
+from pymor.discretizers.builtin.grids.boundaryinfos import GenericBoundaryInfo
+from pymor.discretizers.builtin.grids.rect import RectGrid
+from pymor.discretizers.builtin.grids.tria import TriaGrid
+from pymortests.base import runmodule
+
+pytestmark = pytest.mark.builtin
+
+
+@pytest.mark.parametrize('with_pattern', [False, True])
+@pytest.mark.parametrize('dtype', [np.float64, np.complex128])
+def test_assemble_csc(with_pattern, dtype):
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 10, size=100)
+    cols = rng.integers(0, 7, size=100)
+    data = rng.standard_normal(100).astype(dtype)
+    if np.iscomplexobj(data):
+        data += 1j * rng.standard_normal(100)
+    data[::5] = 0
+    pattern = _csc_pattern(rows, cols, (10, 7)) if with_pattern else None
+    A = _assemble_csc(data, rows, cols, (10, 7), pattern)
+    assert A.format == 'csc'
+    assert A.dtype == dtype
+    assert np.all(A.data != 0)
+    assert np.allclose(A.toarray(), coo_matrix((data, (rows, cols)), shape=(10, 7)).toarray())
+
+
+def test_parametric_reassembly():
+    grid = TriaGrid(num_intervals=(4, 4))
+    boundary_info = GenericBoundaryInfo.from_indicators(grid, {'dirichlet': lambda X: X[..., 0] < 0.5})
+    diffusion = ExpressionFunction('1 + a[0] * x[0]', 2, parameters={'a': 1})
+    op = DiffusionOperatorP1(grid, boundary_info, diffusion_function=diffusion, dirichlet_clear_columns=True)
+    for a in (0., 1., 2.):
+        mu = op.parameters.parse(a)
+        fresh = DiffusionOperatorP1(grid, boundary_info, diffusion_function=diffusion, dirichlet_clear_columns=True)
+        assert np.allclose(op.assemble(mu).matrix.toarray(), fresh.assemble(mu).matrix.toarray())
+    assert hasattr(op, '_grid_data')
+    op = loads(dumps(op))
+    # the grid data is not pickled but fetched again for the next assembly
+    assert not hasattr(op, '_grid_data')
+    assert np.allclose(op.assemble(mu).matrix.toarray(), fresh.assemble(mu).matrix.toarray())
+
+
+def test_is_uniform():
+    A = np.tile([[0.25, 0.], [0., 4.]], (10, 1, 1))
+    assert _is_uniform(A)
+    A[3] *= 1 + 1e-15
+    A[5, 0, 1] = 1e-17
+    assert _is_uniform(A)
+    A[7, 0, 0] = 0.26
+    assert not _is_uniform(A)
+
+
+def test_concurrent_reassembly():
+    grid = TriaGrid(num_intervals=(4, 4))
+    boundary_info = GenericBoundaryInfo.from_indicators(grid, {'dirichlet': lambda X: X[..., 0] < 0.5})
+    diffusion = ExpressionFunction('1 + a[0] * x[0]', 2, parameters={'a': 1})
+    op = DiffusionOperatorP1(grid, boundary_info, diffusion_function=diffusion)
+    mus = [op.parameters.parse(a) for a in np.linspace(0, 1, 8)]
+    expected = [op.assemble(mu).matrix.toarray() for mu in mus]
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda mu: op.assemble(mu).matrix.toarray(), mus))
+    assert all(np.allclose(A, B) for A, B in zip(results, expected))
+    # scratch buffers are thread-local and not stored with the operator
+    assert 'SCRATCH' not in op._grid_data
+
+
+@pytest.mark.parametrize('grid_type,operator', [(TriaGrid, DiffusionOperatorP1), (RectGrid, DiffusionOperatorQ1)])
+@pytest.mark.parametrize('diffusion', [None,
+                                       ExpressionFunction('1 + x[0]', 2),
+                                       ExpressionFunction('[[1 + x[0], 0.5], [0.5, 2]]', 2)])
+def test_diffusion_single_precision_assembly(grid_type, operator, diffusion):
+    grid = grid_type(num_intervals=(4, 4))
+    boundary_info = GenericBoundaryInfo.from_indicators(grid, {'dirichlet': lambda X: X[..., 0] < 0.5})
+    A = operator(grid, boundary_info, diffusion_function=diffusion).assemble().matrix
+    A_single = operator(grid, boundary_info, diffusion_function=diffusion,
+                        assembly_dtype=np.float32).assemble().matrix
+    assert A_single.dtype == np.float64
+    assert np.allclose(A_single.toarray(), A.toarray(), rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize('grid_type,functional', [(TriaGrid, L2ProductFunctionalP1), (RectGrid, L2ProductFunctionalQ1)])
+def test_l2_product_functional_integrates_linear_functions(grid_type, functional):
+    grid = grid_type(domain=([0, 0], [2, 1]), num_intervals=(4, 3))
+    f = ExpressionFunction('x[0]', 2)
+    # the functional applied to the interpolant of 1 is the integral of f over the domain
+    assert np.isclose(functional(grid, f).assemble().matrix.sum(), 2.)
+    f = ExpressionFunction('1.', 2)
+    assert np.isclose(BoundaryL2ProductFunctional(grid, f).assemble().matrix.sum(), 6.)
+
+
+@pytest.mark.parametrize('functional', [L2ProductFunctionalQ1, BoundaryL2ProductFunctional,
+                                        BoundaryDirichletFunctional])
+def test_functional_values_evaluated_lazily(functional):
+    grid = RectGrid(num_intervals=(4, 3))
+    boundary_info = GenericBoundaryInfo.from_indicators(grid, {'dirichlet': lambda X: X[..., 0] < 0.5})
+    evaluations = []
+
+    def mapping(x):
+        evaluations.append(len(x))
+        return x[..., 0]
+
+    op = functional(grid, GenericFunction(mapping, 2), boundary_info=boundary_info)
+    assert not evaluations
+    I = op.assemble().matrix
+    assert len(evaluations) == 1
+    assert np.all(op.assemble().matrix == I)
+    assert len(evaluations) == 1
+
+
+if __name__ == '__main__':
+    runmodule(filename=__file__)
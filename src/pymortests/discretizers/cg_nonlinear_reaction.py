@@ -0,0 +1,228 @@
+# This file is part of the pyMOR project (https://www.pymor.org).
+# Copyright pyMOR developers and contributors. All rights reserved.
+# License: BSD 2-Clause License (https://opensource.org/licenses/BSD-2-Clause)
+
+import gc
+import weakref
+
+import numpy as np
+import pytest
+
+from pymor.algorithms.to_matrix import to_matrix
+from pymor.analyticalproblems.domaindescriptions import RectDomain
+from pymor.analyticalproblems.functions import ConstantFunction, ExpressionFunction, GenericFunction, LincombFunction
+from pymor.discretizers.builtin.grids.boundaryinfos import AllDirichletBoundaryInfo, GenericBoundaryInfo
+from pymor.discretizers.builtin.grids.rect import RectGrid
+from pymor.parameters.base import Parameters
+from pymor.parameters.functionals import ProjectionParameterFunctional
+from pymordemos.discretize_cg_with_nonlinear_reactionoperator import (
+    _PRODUCTS,
+    NonlinearReactionOperator,
+    discretize_stationary_cg,
+    quadratic_functional,
+)
+from pymordemos.stationary_problem import StationaryProblem
+from pymortests.base import runmodule
+
+pytestmark = pytest.mark.builtin
+
+
+def nonlinear_reaction_problem(**kwargs):
+    parameters = Parameters({'reaction': 2})
+    kwargs.setdefault('domain', RectDomain())
+    kwargs.setdefault('diffusion', ConstantFunction(1., 2))
+    return StationaryProblem(
+        rhs=ExpressionFunction('100 * sin(2 * pi * x[0]) * sin(2 * pi * x[1])', 2),
+        nonlinear_reaction_coefficient=ExpressionFunction('1 + x[0]', 2),
+        nonlinear_reaction=ExpressionFunction('reaction[0] * (exp(reaction[1] * u[0]) - 1) / reaction[1]', 1,
+                                              parameters=parameters, variable='u'),
+        nonlinear_reaction_derivative=ExpressionFunction('reaction[0] * exp(reaction[1] * u[0])', 1,
+                                                         parameters=parameters, variable='u'),
+        **kwargs
+    )
+
+
+def test_operator_terms():
+    fom, _ = discretize_stationary_cg(nonlinear_reaction_problem(), diameter=1/4)
+    assert [op.name for op in fom.operator.operators] == ['boundary_part', 'diffusion', 'NonlinearReactionOperator']
+    assert fom.operator.coefficients == (1., 1., 1.)
+
+
+def test_data_term_names():
+    problem = nonlinear_reaction_problem(
+        domain=RectDomain(bottom='neumann', right='robin'),
+        neumann_data=ConstantFunction(1., 2),
+        robin_data=(LincombFunction([ConstantFunction(1., 2)], [ProjectionParameterFunctional('robin')]),
+                    ExpressionFunction('x[1]', 2)),
+        dirichlet_data=LincombFunction([ExpressionFunction('x[0]', 2), ConstantFunction(1., 2)],
+                                       [ProjectionParameterFunctional('dirichlet'), 1.])
+    )
+    fom, _ = discretize_stationary_cg(problem, diameter=1/4, preassemble=False)
+    assert [op.name for op in fom.operator.operators] == ['boundary_part', 'diffusion', 'NonlinearReactionOperator',
+                                                          'robin_0']
+    assert [op.name for op in fom.rhs.operators] == ['rhs', 'BoundaryL2ProductFunctional', 'robin_0',
+                                                     'dirichlet0', 'dirichlet1']
+
+
+@pytest.mark.parametrize('merge_fixed_terms', [False, True])
+def test_merge_fixed_terms(merge_fixed_terms):
+    problem = nonlinear_reaction_problem(
+        diffusion=LincombFunction([ExpressionFunction('1 + x[0]', 2), ConstantFunction(1., 2)],
+                                  [ProjectionParameterFunctional('diffusion'), 1.]),
+        reaction=ConstantFunction(2., 2),
+        domain=RectDomain(bottom='neumann'),
+        neumann_data=ConstantFunction(1., 2),
+        dirichlet_data=LincombFunction([ExpressionFunction('x[0]', 2)], [ProjectionParameterFunctional('dirichlet')])
+    )
+    fom, _ = discretize_stationary_cg(problem, diameter=1/4)
+    merged_fom, _ = discretize_stationary_cg(problem, diameter=1/4, merge_fixed_terms=merge_fixed_terms)
+    if merge_fixed_terms:
+        expected = ['fixed_part', 'diffusion_0', 'NonlinearReactionOperator']
+        expected_rhs = ['fixed_part', 'dirichlet0']
+    else:
+        expected = ['boundary_part', 'diffusion_0', 'diffusion_1', 'reaction', 'NonlinearReactionOperator']
+        expected_rhs = ['rhs', 'BoundaryL2ProductFunctional', 'dirichlet0']
+    assert [op.name for op in merged_fom.operator.operators] == expected
+    assert [op.name for op in merged_fom.rhs.operators] == expected_rhs
+
+    mu = problem.parameters.parse({'diffusion': 0.5, 'dirichlet': 2., 'reaction': [0.3, 0.7]})
+    U = fom.solution_space.from_numpy(np.linspace(0, 1, fom.solution_space.dim))
+    assert np.allclose(merged_fom.operator.apply(U, mu=mu).to_numpy(), fom.operator.apply(U, mu=mu).to_numpy())
+    assert np.allclose(merged_fom.operator.jacobian(U, mu=mu).matrix.toarray(),
+                       fom.operator.jacobian(U, mu=mu).matrix.toarray())
+    assert np.allclose(merged_fom.rhs.as_range_array(mu).to_numpy(), fom.rhs.as_range_array(mu).to_numpy())
+
+
+@pytest.mark.parametrize('diffusion', ['[[1 + x[0], 0.5], [0.2, 2]]', '[[1 + x[0], 0.5j], [0.2, 2]]'])
+def test_energy_product(diffusion):
+    problem = nonlinear_reaction_problem(diffusion=ExpressionFunction(diffusion, 2))
+    mu = problem.parameters.parse({'reaction': [1., 1.]})
+    fom, _ = discretize_stationary_cg(problem, diameter=1/4, mu_energy_product=mu)
+    unassembled_fom, _ = discretize_stationary_cg(problem, diameter=1/4, mu_energy_product=mu, preassemble=False)
+    # the energy product is the hermitian part of the operator for mu_energy_product
+    energy = fom.products['energy'].matrix.toarray()
+    assert np.allclose(energy, energy.conj().T)
+    assert np.allclose(energy, to_matrix(unassembled_fom.products['energy'], format='dense'))
+
+
+def check_element_contributions(contributions, total, n, to_numpy=np.asarray):
+    # the element contributions behave like the list of the contributions of all elements
+    assert len(contributions) == n
+    values = [to_numpy(c) for c in contributions]
+    assert len(values) == n
+    assert np.allclose(sum(values), total)
+    assert np.allclose(to_numpy(contributions[-1]), values[-1])
+    assert np.allclose(to_numpy(contributions[-n]), values[0])
+    sliced = contributions[1:7:2]
+    assert len(sliced) == 3
+    assert all(np.allclose(to_numpy(c), v) for c, v in zip(sliced, values[1:7:2]))
+    assert len(contributions[n + 5:]) == 0
+    for e in (n, -n - 1):
+        with pytest.raises(IndexError):
+            contributions[e]
+    return values
+
+
+def test_element_contributions():
+    problem = nonlinear_reaction_problem()
+    fom, data = discretize_stationary_cg(problem, diameter=1/4)
+    grid = data['grid']
+    n = grid.size(0)
+    subentities = grid.subentities(0, grid.dim)
+    op = fom.operator.operators[2]
+    U = op.source.from_numpy(np.linspace(0, 1, op.source.dim))
+    mu = problem.parameters.parse({'reaction': [0.5, 0.1]})
+
+    A, contributions = op.apply(U, mu=mu, element_contribution=True)
+    vectors = check_element_contributions(contributions, A, n, lambda v: v.to_numpy().ravel())
+    for e, v in enumerate(vectors):
+        assert np.all(np.delete(v, subentities[e]) == 0)
+
+    J, contributions = op.jacobian(U, mu=mu, element_contribution=True)
+    check_element_contributions(contributions, J.matrix.toarray(), n, lambda o: o.matrix.toarray())
+
+    mu_d = problem.parameters.parse({'reaction': [1., 0.2]})
+    j = quadratic_functional(grid, fom.solution_space.zeros(), mu_d)
+    value, contributions = j.apply(U, mu=mu, element_contribution=True)
+    check_element_contributions(contributions, value, n, lambda v: v.to_numpy().ravel())
+    dj, contributions = j.jacobian(U, mu=mu, element_contribution=True)
+    check_element_contributions(contributions, dj.matrix, n, lambda o: o.matrix)
+
+    # one array of the volume fraction of the element times mu - mu_d per element
+    diff = mu.to_numpy() - mu_d.to_numpy()
+    d_mu, contributions = j.d_mu(mu, index=1, element_contribution=True)
+    assert d_mu == diff[1]
+    volumes = grid.volumes(0)
+    values = check_element_contributions(contributions, diff, n)
+    assert all(np.allclose(v, volumes[e] / volumes.sum() * diff) for e, v in enumerate(values))
+
+
+def test_products_shared_by_grid():
+    grid = RectGrid(num_intervals=(4, 4))
+    boundary_info = GenericBoundaryInfo.from_indicators(grid, {'dirichlet': lambda X: X[..., 0] < 0.5})
+    fom, _ = discretize_stationary_cg(nonlinear_reaction_problem(), grid=grid, boundary_info=boundary_info,
+                                      preassemble=False)
+    other_fom, _ = discretize_stationary_cg(nonlinear_reaction_problem(diffusion=ConstantFunction(2., 2)), grid=grid,
+                                            boundary_info=boundary_info, preassemble=False)
+    assert fom.products.keys() == other_fom.products.keys()
+    assert all(fom.products[k] is other_fom.products[k] for k in fom.products)
+
+    # the products for boundary infos which are no longer used are dropped from the cache
+    for _ in range(4):
+        discretize_stationary_cg(nonlinear_reaction_problem(), grid=grid, boundary_info=AllDirichletBoundaryInfo(grid))
+    gc.collect()
+    assert sum(key[0] is grid for key in _PRODUCTS.keys()) == 6
+
+    # the products do not keep the grid alive
+    grid_ref = weakref.ref(grid)
+    del grid, boundary_info, fom, other_fom, _
+    gc.collect()
+    assert grid_ref() is None
+
+
+def test_single_precision_assembly():
+    grid = RectGrid(num_intervals=(4, 4))
+    boundary_info = GenericBoundaryInfo.from_indicators(grid, {'dirichlet': lambda X: X[..., 0] < 0.5})
+    dtypes = set()
+
+    def record_dtype(f):
+        def mapping(u):
+            dtypes.add(u.dtype)
+            return f(u[..., 0])
+        return GenericFunction(mapping)
+
+    def nonlinear_reaction_operator(assembly_dtype):
+        return NonlinearReactionOperator(grid, boundary_info, ExpressionFunction('1 + x[0]', 2),
+                                         record_dtype(np.exp), record_dtype(np.exp), assembly_dtype=assembly_dtype)
+
+    op, op_single = nonlinear_reaction_operator(np.float64), nonlinear_reaction_operator(np.float32)
+    U = op.source.from_numpy(np.linspace(0, 1, op.source.dim))
+    V, J = op.apply(U), op.jacobian(U).matrix
+    assert dtypes == {np.dtype(np.float64)}
+    dtypes.clear()
+    V_single, J_single = op_single.apply(U), op_single.jacobian(U).matrix
+    # c_nl and its derivative are evaluated in single precision ...
+    assert dtypes == {np.dtype(np.float32)}
+    # ... but the results are of double precision
+    assert V_single.to_numpy().dtype == np.float64
+    assert J_single.dtype == np.float64
+    assert np.allclose(V_single.to_numpy(), V.to_numpy(), rtol=1e-5, atol=1e-5)
+    assert np.allclose(J_single.toarray(), J.toarray(), rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize('num_mus', [0, 1, 3])
+def test_apply_batch(num_mus):
+    problem = nonlinear_reaction_problem(domain=RectDomain(bottom='neumann'))
+    fom, _ = discretize_stationary_cg(problem, diameter=1/4)
+    op = fom.operator.operators[2]
+    U = op.source.from_numpy(np.linspace(0, 1, op.source.dim))
+    mus = [problem.parameters.parse({'reaction': [0.5 + i, 0.1 * (i + 1)]}) for i in range(num_mus)]
+    V = op.apply_batch(U, mus)
+    assert V in op.range
+    assert len(V) == num_mus
+    for i, mu in enumerate(mus):
+        assert np.allclose(V[i].to_numpy(), op.apply(U, mu=mu).to_numpy())
+
+
+if __name__ == '__main__':
+    runmodule(filename=__file__)